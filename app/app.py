@@ -1,9 +1,12 @@
 import os
+import glob
+import calendar
 import dropbox
 from dotenv import load_dotenv
 import streamlit as st
 import duckdb
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
@@ -24,9 +27,17 @@ DROPBOX_UPLOAD_PATH = os.getenv("DROPBOX_UPLOAD_PATH")
 DROPBOX_GEOJSON_PATH = os.getenv("DROPBOX_GEOJSON_PATH")
 
 # ---------------
-# Dropbox Connection with Refresh Token
+# AQI Categories (upper bounds are inclusive)
 # ---------------
+AQI_BINS = np.array([-np.inf, 50, 100, 150, 200, 300, np.inf])
+AQI_LABELS = ["Good", "Moderate", "Unhealthy (Sensitive)", "Unhealthy", "Very Unhealthy", "Hazardous"]
+AQI_COLORS = ["#00e400", "#ffff00", "#ff7e00", "#ff0000", "#8f3f97", "#7e0023"]
+NO_DATA_COLOR = "#d3d3d3"
 
+# ---------------
+# Dropbox Connection with Refresh Token
+# ---------------
+@st.cache_resource
 def create_dropbox_client():
     dbx = dropbox.Dropbox(
         oauth2_refresh_token=DROPBOX_REFRESH_TOKEN,
@@ -39,47 +50,184 @@ def create_dropbox_client():
 # ---------------
 # Load AQ Data (Fresh Dropbox Download)
 # ---------------
-@st.cache_data
-def load_data():
-    local_path = "/tmp/dummy_air_quality.duckdb"
-    rev_path = "/tmp/dummy_air_quality.rev"
+def connect_read_only(path):
+    conn = duckdb.connect(path, read_only=True)
+    conn.execute(f"SET threads = {os.cpu_count() or 1}")
+    conn.execute("PRAGMA enable_object_cache")
+    return conn
+
+def build_daily_table(path):
+    # Per-day rollup for the daily averages, rebuilt once per downloaded revision.
+    # Sums and counts (not averages) so multi-ZIP days weight every hourly reading equally.
+    conn = duckdb.connect(path)
+    conn.execute("""
+        CREATE OR REPLACE TABLE daily_aqi AS
+        SELECT date_trunc('day', Hour_Timestamp) AS d, Zip_Code, sum(Avg_AQI) AS sum_aqi, count(*) AS n
+        FROM air_quality_hourly
+        GROUP BY 1, 2
+        ORDER BY 1
+    """)
+    conn.close()
 
-    st.info("Checking Dropbox for latest data...")
+@st.cache_data(ttl=60, show_spinner=False)
+def get_remote_rev(path):
+    # Reruns within a minute reuse the rev instead of a metadata round trip to Dropbox
+    return create_dropbox_client().files_get_metadata(path).rev
+
+def local_data_path(remote_rev):
+    # One file per revision: DuckDB reuses an open database for the same path,
+    # so a new revision needs a new path
+    return f"/tmp/dummy_air_quality_{remote_rev}.duckdb"
+
+@st.cache_resource(show_spinner=False)
+def download_revision(remote_rev):
+    # Cached so concurrent sessions share one download; renders nothing itself
+    local_path = local_data_path(remote_rev)
+
+    # Stream straight to disk instead of buffering the whole file in memory
+    part_path = local_path + ".part"
+    create_dropbox_client().files_download_to_file(part_path, DROPBOX_UPLOAD_PATH)
+    build_daily_table(part_path)
+    os.replace(part_path, local_path)
+
+    # Keep the previous revision: runs and Trends fragment reruns that started
+    # before this download still query it. Anything older is removed.
+    old_paths = sorted(
+        (p for p in glob.glob("/tmp/dummy_air_quality_*.duckdb") if p != local_path),
+        key=os.path.getmtime, reverse=True
+    )
+    for old_path in old_paths[1:]:
+        os.remove(old_path)
+    return local_path
 
-    dbx = create_dropbox_client()
+def sync_data():
+    # Uncached so the status messages render once, at the top of the page
+    st.info("Checking Dropbox for latest data...")
 
-    # Get remote file metadata
-    metadata = dbx.files_get_metadata(DROPBOX_UPLOAD_PATH)
-    remote_rev = metadata.rev
-
-    # Check if local file exists and has matching rev
-    if os.path.exists(local_path) and os.path.exists(rev_path):
-        with open(rev_path, "r") as f:
-            local_rev = f.read().strip()
-        if local_rev == remote_rev:
-            st.success("Local data is up-to-date.")
-            conn = duckdb.connect(local_path, read_only=True)
-            df_hourly = conn.execute("SELECT * FROM air_quality_hourly").fetchdf()
-            conn.close()
-            return df_hourly
+    remote_rev = get_remote_rev(DROPBOX_UPLOAD_PATH)
+    if os.path.exists(local_data_path(remote_rev)):
+        st.success("Local data is up-to-date.")
+        return remote_rev
 
     # Download fresh copy if new revision detected
     st.info("New version detected. Downloading updated data from Dropbox...")
-
-    with open(local_path, "wb") as f:
-        metadata, res = dbx.files_download(DROPBOX_UPLOAD_PATH)
-        f.write(res.content)
-
-    # Store new rev locally
-    with open(rev_path, "w") as f:
-        f.write(remote_rev)
-
+    download_revision(remote_rev)
     st.success("Download complete.")
+    return remote_rev
 
-    conn = duckdb.connect(local_path, read_only=True)
-    df_hourly = conn.execute("SELECT * FROM air_quality_hourly").fetchdf()
-    conn.close()
-    return df_hourly
+@st.cache_resource(max_entries=2, show_spinner=False)
+def open_data_conn(remote_rev):
+    # One read-only connection each for the current and previous revision (matching the
+    # files kept by download_revision); queries below only pull what each view needs
+    return connect_read_only(local_data_path(remote_rev))
+
+# ---------------
+# AQ Queries (filters and aggregations run inside DuckDB)
+# ---------------
+# Every helper takes the data revision first so cached results never outlive the file they came from
+def run_query(rev, sql, params=None):
+    # The connection is shared across sessions; give each query its own cursor
+    with open_data_conn(rev).cursor() as cur:
+        return cur.execute(sql, params).fetchdf()
+
+def where_clause(zips, time_col="Hour_Timestamp"):
+    # IN (NULL) matches nothing when no ZIPs are selected
+    placeholders = ", ".join("?" for _ in zips) or "NULL"
+    return f"Zip_Code IN ({placeholders}) AND {time_col} >= ? AND {time_col} < ?"
+
+def filter_params(zips, start, end):
+    # `end` is the last day included: every hour of it counts, in both the hourly table and daily_aqi
+    return [*zips, start, end + pd.Timedelta(days=1)]
+
+@st.cache_data(ttl=600)
+def get_zip_codes(rev):
+    df = run_query(rev, "SELECT DISTINCT Zip_Code FROM air_quality_hourly ORDER BY 1")
+    return df["Zip_Code"].tolist()
+
+@st.cache_data(ttl=600)
+def get_year_month_pairs(rev, zips=None, start=None, end=None):
+    # Without filters this lists every month in the table
+    where, params = "", None
+    if zips is not None:
+        where, params = f"WHERE {where_clause(zips)}", filter_params(zips, start, end)
+
+    with open_data_conn(rev).cursor() as cur:
+        return cur.execute(f"""
+            SELECT DISTINCT year(Hour_Timestamp) AS y, month(Hour_Timestamp) AS m
+            FROM air_quality_hourly
+            {where}
+            ORDER BY 1, 2
+        """, params).fetchall()
+
+@st.cache_data(ttl=600)
+def get_daily_avg(rev, zips, start, end):
+    # Reads the per-day rollup (one row per ZIP per day) instead of hourly readings
+    return run_query(rev, f"""
+        SELECT d AS Date, sum(sum_aqi) / sum(n) AS Avg_AQI
+        FROM daily_aqi
+        WHERE {where_clause(zips, time_col="d")}
+        GROUP BY 1
+        ORDER BY 1
+    """, filter_params(zips, start, end))
+
+@st.cache_data(ttl=600)
+def get_summary_stats(rev, zips, start, end):
+    return run_query(rev, f"""
+        SELECT avg(Avg_AQI) AS Avg_AQI, count(*) AS Readings
+        FROM air_quality_hourly
+        WHERE {where_clause(zips)}
+    """, filter_params(zips, start, end)).iloc[0]
+
+@st.cache_data(ttl=600)
+def get_hour_of_day_avg(rev, zips, start, end):
+    return run_query(rev, f"""
+        SELECT hour(Hour_Timestamp) AS Hour, avg(Avg_AQI) AS Avg_AQI
+        FROM air_quality_hourly
+        WHERE {where_clause(zips)}
+        GROUP BY 1
+        ORDER BY 1
+    """, filter_params(zips, start, end))
+
+@st.cache_data(ttl=600)
+def get_zip_summary(rev, zips, start, end):
+    return run_query(rev, f"""
+        SELECT Zip_Code, avg(Avg_AQI) AS Avg_AQI, count(DISTINCT Sensor_ID) AS Num_Sensors
+        FROM air_quality_hourly
+        WHERE {where_clause(zips)}
+        GROUP BY 1
+    """, filter_params(zips, start, end))
+
+@st.cache_data(ttl=600)
+def get_latest_per_zip(rev, zips, start, end):
+    # Most recent reading per ZIP via a window scan instead of a full sort + groupby
+    return run_query(rev, f"""
+        SELECT Zip_Code, Hour_Timestamp, Avg_AQI
+        FROM air_quality_hourly
+        WHERE {where_clause(zips)}
+        QUALIFY row_number() OVER (PARTITION BY Zip_Code ORDER BY Hour_Timestamp DESC) = 1
+    """, filter_params(zips, start, end))
+
+@st.cache_data(ttl=600)
+def get_aqi_category_counts(rev, zips, start, end):
+    # Bucket ids index into AQI_LABELS
+    counts = run_query(rev, f"""
+        SELECT
+            CASE
+                WHEN Avg_AQI <= 50 THEN 0
+                WHEN Avg_AQI <= 100 THEN 1
+                WHEN Avg_AQI <= 150 THEN 2
+                WHEN Avg_AQI <= 200 THEN 3
+                WHEN Avg_AQI <= 300 THEN 4
+                ELSE 5
+            END AS Bucket,
+            count(*) AS Count
+        FROM air_quality_hourly
+        WHERE {where_clause(zips)}
+        GROUP BY 1
+        ORDER BY 1
+    """, filter_params(zips, start, end))
+    counts.insert(0, "Category", [AQI_LABELS[b] for b in counts["Bucket"]])
+    return counts.drop(columns="Bucket")
 
 # -------------------------------
 # Download GeoJSON from Dropbox
@@ -93,8 +241,7 @@ def load_geojson():
     local_path = "/tmp/Fresno_County_ZipCodes.geojson"
     rev_path = "/tmp/Fresno_County_ZipCodes.rev"
 
-    metadata = dbx.files_get_metadata(DROPBOX_GEOJSON_PATH)
-    remote_rev = metadata.rev
+    remote_rev = get_remote_rev(DROPBOX_GEOJSON_PATH)
 
     # Check if file already downloaded and revision matches
     if os.path.exists(local_path) and os.path.exists(rev_path):
@@ -108,13 +255,7 @@ def load_geojson():
     # Download fresh copy if new revision detected
     st.info("Downloading updated GeoJSON from Dropbox...")
 
-    metadata, res = dbx.files_download(DROPBOX_GEOJSON_PATH)
-    
-    # Decode Dropbox response content properly
-    geojson_data = res.content.decode("utf-8")
-
-    with open(local_path, "w") as f:
-        f.write(geojson_data)
+    dbx.files_download_to_file(local_path, DROPBOX_GEOJSON_PATH)
 
     with open(rev_path, "w") as f:
         f.write(remote_rev)
@@ -127,10 +268,10 @@ def load_geojson():
 # Load Data
 # ---------------
 
-# Load AQ Data
-df = load_data()
-df['Hour_Timestamp'] = pd.to_datetime(df['Hour_Timestamp'])
-zip_codes = sorted(df["Zip_Code"].unique())
+# Load AQ Data (syncs from Dropbox; the shared connection reopens when the revision changes)
+# Resolved once per run and passed to every query helper as part of its cache key
+data_rev = sync_data()
+zip_codes = get_zip_codes(data_rev)
 
 # Load GeoJSON
 geo_gdf = load_geojson()
@@ -158,8 +299,7 @@ with st.expander("Filter ZIP Codes", expanded=False):
 # After ZIP Code multiselect
 
 # Second row: Date Filter (All 4 dropdowns in one row)
-df_dates = df["Hour_Timestamp"].dt.to_period("M").drop_duplicates().sort_values()
-year_month_pairs = [(p.year, p.month) for p in df_dates]
+year_month_pairs = get_year_month_pairs(data_rev)
 years = sorted(set(y for y, m in year_month_pairs))
 months_lookup = {year: sorted(m for y, m in year_month_pairs if y == year) for year in years}
 
@@ -168,23 +308,32 @@ col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
 with col1:
     year_start = st.selectbox("Start Year", years, key="start_year")
 with col2:
-    start_month_options = [datetime(1900, m, 1).strftime('%B') for m in months_lookup[year_start]]
-    month_start = st.selectbox("Start Month", start_month_options, key="start_month")
+    month_start = st.selectbox(
+        "Start Month", months_lookup[year_start],
+        format_func=lambda m: calendar.month_name[m], key="start_month"
+    )
 with col3:
     year_end = st.selectbox("End Year", years, index=len(years)-1, key="end_year")
 with col4:
-    end_month_options = [datetime(1900, m, 1).strftime('%B') for m in months_lookup[year_end]]
-    month_end = st.selectbox("End Month", end_month_options, index=len(end_month_options)-1, key="end_month")
+    month_end = st.selectbox(
+        "End Month", months_lookup[year_end], index=len(months_lookup[year_end])-1,
+        format_func=lambda m: calendar.month_name[m], key="end_month"
+    )
 
-start_dt = datetime.strptime(f"{month_start} {year_start}", "%B %Y")
-end_dt = datetime.strptime(f"{month_end} {year_end}", "%B %Y")
-end_dt = end_dt.replace(day=1) + pd.offsets.MonthEnd(1)
+start_dt = datetime(year_start, month_start, 1)
+# Last day of the end month; queries include all of its hours
+end_dt = datetime(year_end, month_end, 1) + pd.offsets.MonthEnd(1)
 st.markdown(
     f"<p style='font-size:0.8em; color: grey;'>(Time Period: {start_dt.strftime('%b %Y')} - {end_dt.strftime('%b %Y')})</p>", 
     unsafe_allow_html=True
 )
 
-filtered_df = df[(df["Zip_Code"].isin(selected_zips)) & (df["Hour_Timestamp"] >= start_dt) & (df["Hour_Timestamp"] <= end_dt)]
+# Cache key for the query helpers below (sorted so selection order doesn't miss the cache)
+zip_key = tuple(sorted(selected_zips))
+
+# Only aggregates leave DuckDB; the reading count doubles as the empty-filter check
+summary = get_summary_stats(data_rev, zip_key, start_dt, end_dt)
+no_data = summary["Readings"] == 0
 
 # ---------------
 # Main Tabs
@@ -194,17 +343,17 @@ tab1, tab2, tab3, tab4 = st.tabs(["📊 Overview", "📈 Trends", "🗺 Map", "
 # ---------------------------
 # Overview Tab
 # ---------------------------
-with tab1:
+def overview_tab(no_data, summary, rev, zip_key, start_dt, end_dt):
     subtab1, subtab2 = st.tabs(["🔢 Summary Metrics", "🎯 AQI Categories"])
 
     # -------- Summary Metrics --------
     with subtab1:
-        if filtered_df.empty:
+        if no_data:
             st.warning("No data available for selected filters.")
         else:
             # ---------------- Summary metrics ----------------
-            latest = filtered_df.sort_values("Hour_Timestamp").groupby("Zip_Code").tail(1)
-            avg_aqi = round(filtered_df["Avg_AQI"].mean(), 1)
+            latest = get_latest_per_zip(rev, zip_key, start_dt, end_dt)
+            avg_aqi = round(summary["Avg_AQI"], 1)
             
             best_zip = latest.loc[latest["Avg_AQI"].idxmin()]
             worst_zip = latest.loc[latest["Avg_AQI"].idxmax()]
@@ -214,9 +363,8 @@ with tab1:
             col2.metric("✅ Best ZIP", f"{best_zip['Zip_Code']} ({round(best_zip['Avg_AQI'],1)})")
             col3.metric("🔥 Worst ZIP", f"{worst_zip['Zip_Code']} ({round(worst_zip['Avg_AQI'],1)})")
 
-            # Convert to daily summaries (truncate timestamp to date)
-            filtered_df["Date"] = filtered_df["Hour_Timestamp"].dt.date
-            daily_aqi = filtered_df.groupby("Date")["Avg_AQI"].mean().reset_index()
+            # Daily summaries (from the daily_aqi rollup)
+            daily_aqi = get_daily_avg(rev, zip_key, start_dt, end_dt)
 
             total_days = daily_aqi.shape[0]
             good_days = daily_aqi[daily_aqi["Avg_AQI"] <= 50].shape[0]
@@ -225,7 +373,7 @@ with tab1:
             pct_good_days = round((good_days / total_days) * 100, 1) if total_days > 0 else 0
             pct_unhealthy_days = round((unhealthy_days / total_days) * 100, 1) if total_days > 0 else 0
 
-            total_observations = filtered_df.shape[0]
+            total_observations = int(summary["Readings"])
 
             st.divider()
 
@@ -246,41 +394,13 @@ with tab1:
 
     # -------- AQI Category Distribution --------
     with subtab2:
-        if filtered_df.empty:
+        if no_data:
             st.warning("No data available for selected filters.")
         else:
-            def categorize_aqi(aqi):
-                if aqi <= 50: return "Good"
-                elif aqi <= 100: return "Moderate"
-                elif aqi <= 150: return "Unhealthy (Sensitive)"
-                elif aqi <= 200: return "Unhealthy"
-                elif aqi <= 300: return "Very Unhealthy"
-                else: return "Hazardous"
-
-            filtered_df["AQI_Category"] = filtered_df["Avg_AQI"].apply(categorize_aqi)
-            cat_counts = filtered_df["AQI_Category"].value_counts().reset_index()
-            cat_counts.columns = ["Category", "Count"]
-
-            category_order = [
-                "Good", "Moderate", "Unhealthy (Sensitive)", 
-                "Unhealthy", "Very Unhealthy", "Hazardous"
-            ]
-
-            cat_counts["Category"] = pd.Categorical(
-                cat_counts["Category"], 
-                categories=category_order, 
-                ordered=True
-            )
-            cat_counts = cat_counts.sort_values("Category")
+            # Rows come back in category order, one per non-empty bucket
+            cat_counts = get_aqi_category_counts(rev, zip_key, start_dt, end_dt)
 
-            color_map = {
-                "Good": "#00e400",
-                "Moderate": "#ffff00",
-                "Unhealthy (Sensitive)": "#ff7e00",
-                "Unhealthy": "#ff0000",
-                "Very Unhealthy": "#8f3f97",
-                "Hazardous": "#7e0023"
-            }
+            color_map = dict(zip(AQI_LABELS, AQI_COLORS))
 
             fig = px.pie(
                 cat_counts,
@@ -301,22 +421,27 @@ with tab1:
             </p>
             """, unsafe_allow_html=True)
             
+
+with tab1:
+    overview_tab(no_data, summary, data_rev, zip_key, start_dt, end_dt)
+
 # ---------------
 # Trends Tab
 # ---------------
-with tab2:
+# Fragment: the Trends year/month pickers rerun only this tab, not the whole page
+@st.fragment
+def trends_tab(no_data, summary, rev, zip_key, start_dt, end_dt):
     st.header("Time Trends")
     subtab1, subtab2 = st.tabs(["📅 Monthly AQI Trends", "⌚ Time-of-Day Heatmap"])
 
     with subtab1:
-        if filtered_df.empty:
+        if no_data:
             st.warning("No data available for selected filters.")
         else:
             st.subheader("📅 Monthly Trends (Average Across ZIPs)")
 
             # Extract year/month pairs
-            df_dates = filtered_df["Hour_Timestamp"].dt.to_period("M").drop_duplicates().sort_values()
-            year_month_pairs = [(p.year, p.month) for p in df_dates]
+            year_month_pairs = get_year_month_pairs(rev, zip_key, start_dt, end_dt)
             years = sorted(set(y for y, m in year_month_pairs))
             months_lookup = {year: sorted(m for y, m in year_month_pairs if y == year) for year in years}
 
@@ -325,33 +450,34 @@ with tab2:
             with col1:
                 selected_year = st.selectbox("Select Year", years, key="trends_year")
             with col2:
-                month_options = [datetime(1900, m, 1).strftime('%B') for m in months_lookup[selected_year]]
-                selected_month = st.selectbox("Select Month", month_options, key="trends_month")
+                selected_month = st.selectbox(
+                    "Select Month", months_lookup[selected_year],
+                    format_func=lambda m: calendar.month_name[m], key="trends_month"
+                )
 
-            # Filter to selected month
-            month_num = datetime.strptime(selected_month, "%B").month
-            start_month_dt = datetime(selected_year, month_num, 1)
-            end_month_dt = start_month_dt + pd.offsets.MonthEnd(0)
+            # Selected month bounds
+            start_month_dt = datetime(selected_year, selected_month, 1)
+            last_day_dt = start_month_dt + pd.offsets.MonthEnd(0)
 
-            month_df = filtered_df[
-                (filtered_df["Hour_Timestamp"].dt.date >= start_month_dt.date()) &
-                (filtered_df["Hour_Timestamp"].dt.date <= end_month_dt.date())
-            ]
+            # Daily average across all ZIP codes, clipped to the global date filter
+            daily_avg = get_daily_avg(
+                rev, zip_key,
+                max(start_month_dt, start_dt),
+                min(last_day_dt, end_dt)
+            )
 
-            if month_df.empty:
+            if daily_avg.empty:
                 st.warning("No data available for this month.")
             else:
-                # Daily average across all ZIP codes
-                month_df["Date"] = month_df["Hour_Timestamp"].dt.date
-                daily_avg = month_df.groupby("Date")["Avg_AQI"].mean().reset_index()
-
-                fig = px.line(
-                    daily_avg, 
-                    x="Date", y="Avg_AQI",
-                    title=f"Daily Average AQI - {selected_month} {selected_year}",
-                    markers=True
+                # WebGL trace: drawn on a canvas instead of one SVG node per point
+                fig = go.Figure(go.Scattergl(
+                    x=daily_avg["Date"], y=daily_avg["Avg_AQI"],
+                    mode="lines+markers"
+                ))
+                fig.update_layout(
+                    title=f"Daily Average AQI - {calendar.month_name[selected_month]} {selected_year}",
+                    yaxis_title="AQI", xaxis_title="Date"
                 )
-                fig.update_layout(yaxis_title="AQI", xaxis_title="Date")
                 st.plotly_chart(fig, use_container_width=True)
 
 # ---------- Chart Summary -----------
@@ -361,9 +487,9 @@ with tab2:
                 )
                 
                 # Display applied filters
-                month_display = f"{selected_month} {selected_year}"
-                num_zips = len(selected_zips)
-                zip_list = ', '.join(selected_zips)
+                month_display = f"{calendar.month_name[selected_month]} {selected_year}"
+                num_zips = len(zip_key)
+                zip_list = ', '.join(zip_key)
 
                 # Find highest and lowest AQI dates
                 max_row = daily_avg.loc[daily_avg['Avg_AQI'].idxmax()]
@@ -384,59 +510,55 @@ with tab2:
                 )
     
     with subtab2:
-        if filtered_df.empty:
+        if no_data:
             st.warning("No data available for selected filters.")
         else:
             st.subheader("Time-of-Day Trends (Average AQI by Hour of Day)")
 
             # Aggregate across hours
-            hourly_df = filtered_df.copy()
-            hourly_df["Hour"] = hourly_df["Hour_Timestamp"].dt.hour
-            hour_avg = hourly_df.groupby("Hour")["Avg_AQI"].mean().reset_index()
-
-            fig_hour = px.line(hour_avg, x="Hour", y="Avg_AQI", markers=True,
-                               title="Average AQI Pattern Across 24 Hours",
-                               labels={"Hour": "Hour of Day", "Avg_AQI": "Average AQI"})
-            fig_hour.update_layout(xaxis=dict(tickmode="linear", dtick=1))
+            hour_avg = get_hour_of_day_avg(rev, zip_key, start_dt, end_dt)
+
+            fig_hour = go.Figure(go.Scattergl(
+                x=hour_avg["Hour"], y=hour_avg["Avg_AQI"],
+                mode="lines+markers"
+            ))
+            fig_hour.update_layout(
+                title="Average AQI Pattern Across 24 Hours",
+                xaxis_title="Hour of Day", yaxis_title="Average AQI",
+                xaxis=dict(tickmode="linear", dtick=1)
+            )
             st.plotly_chart(fig_hour, use_container_width=True)
 
             st.markdown("<p style='font-size:0.9em; color:grey;'><b>How air quality varies throughout the day:</b><br>This chart shows the average AQI for each hour, aggregated across your selected ZIP codes and time period.</p>", unsafe_allow_html=True)
 
-
+with tab2:
+    trends_tab(no_data, summary, data_rev, zip_key, start_dt, end_dt)
 
 # ---------------
 # Map Tab
 # ---------------
 # ------------------- Map Tab -------------------
-with tab3:
+def map_tab(no_data, summary, rev, zip_key, start_dt, end_dt):
     st.header("Fresno County Air Quality Map")
 
-    if filtered_df.empty:
+    if no_data:
         st.warning("No data available for selected filters.")
     else:
         # Load Fresno County GeoJSON
         geo_gdf = load_geojson()
 
         # Aggregate data per ZIP
-        zip_summary = filtered_df.groupby("Zip_Code").agg({
-            "Avg_AQI": "mean",
-            "Sensor_ID": "nunique"
-        }).reset_index().rename(columns={"Sensor_ID": "Num_Sensors"})
+        zip_summary = get_zip_summary(rev, zip_key, start_dt, end_dt)
 
         # Merge with GeoJSON shapes
         geo_gdf = geo_gdf.merge(zip_summary, left_on="Zip_Code", right_on="Zip_Code", how="left")
 
-        # Assign AQI color buckets
-        def aqi_color(aqi):
-            if pd.isna(aqi): return "#d3d3d3"
-            if aqi <= 50: return "#00e400"
-            elif aqi <= 100: return "#ffff00"
-            elif aqi <= 150: return "#ff7e00"
-            elif aqi <= 200: return "#ff0000"
-            elif aqi <= 300: return "#8f3f97"
-            else: return "#7e0023"
-
-        geo_gdf["Color"] = geo_gdf["Avg_AQI"].apply(aqi_color)
+        # Assign AQI color buckets (ZIPs without readings stay grey)
+        geo_gdf["Color"] = (
+            pd.cut(geo_gdf["Avg_AQI"].to_numpy(), AQI_BINS, labels=AQI_COLORS, right=True)
+            .add_categories(NO_DATA_COLOR)
+            .fillna(NO_DATA_COLOR)
+        )
 
         # Prepare the GeoJSON interface
         geojson_interface = geo_gdf.set_index("Zip_Code").geometry.__geo_interface__
@@ -447,9 +569,7 @@ with tab3:
             geojson=geojson_interface,
             locations="Zip_Code",
             color="Avg_AQI",
-            color_continuous_scale=[
-                "#00e400", "#ffff00", "#ff7e00", "#ff0000", "#8f3f97", "#7e0023"
-            ],
+            color_continuous_scale=AQI_COLORS,
             range_color=(0, 300),
             mapbox_style="carto-positron",
             center={"lat": 36.74, "lon": -119.78},
@@ -469,6 +589,8 @@ with tab3:
 
         st.plotly_chart(fig, use_container_width=True)
 
+with tab3:
+    map_tab(no_data, summary, data_rev, zip_key, start_dt, end_dt)
 
 # ---------------
 # About Tab
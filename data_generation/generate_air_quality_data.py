@@ -51,22 +51,23 @@ monthly_pm25_ranges = {
 # AQI Calculation Function
 # -----------------
 def calculate_aqi(pm25_array):
-    result = []
-    for pm in pm25_array:
-        bp = [
-            (0.0, 12.0, 0, 50), (12.1, 35.4, 51, 100),
-            (35.5, 55.4, 101, 150), (55.5, 150.4, 151, 200),
-            (150.5, 250.4, 201, 300), (250.5, 350.4, 301, 400),
-            (350.5, 500.4, 401, 500)
-        ]
-        for Clow, Chigh, Ilow, Ihigh in bp:
-            if Clow <= pm <= Chigh:
-                aqi = ((Ihigh - Ilow) / (Chigh - Clow)) * (pm - Clow) + Ilow
-                result.append(round(aqi))
-                break
-        else:
-            result.append(500)  # Cap to 500 if PM2.5 is extremely high
-    return np.array(result)
+    bp = np.array([
+        (0.0, 12.0, 0, 50), (12.1, 35.4, 51, 100),
+        (35.5, 55.4, 101, 150), (55.5, 150.4, 151, 200),
+        (150.5, 250.4, 201, 300), (250.5, 350.4, 301, 400),
+        (350.5, 500.4, 401, 500)
+    ])
+    Clow, Chigh, Ilow, Ihigh = bp.T
+    pm = np.asarray(pm25_array, dtype=float)
+
+    # Vectorized breakpoint lookup: first row whose upper bound covers each reading
+    idx = np.searchsorted(Chigh, pm, side="left")
+    matched = idx < len(bp)
+    idx = np.minimum(idx, len(bp) - 1)
+    matched &= pm >= Clow[idx]
+
+    aqi = ((Ihigh[idx] - Ilow[idx]) / (Chigh[idx] - Clow[idx])) * (pm - Clow[idx]) + Ilow[idx]
+    return np.where(matched, np.round(aqi), 500).astype(int)  # Cap to 500 if PM2.5 is extremely high
 
 # -----------------
 # Generate Sensor Metadata